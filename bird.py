@@ -1,30 +1,127 @@
-import xml.etree.ElementTree as ET
+import copy
+import gzip
 from dataclasses import dataclass, field
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Optional, Sequence, Tuple, Union
 import re
 import json
 from pathlib import Path
 
-@dataclass
+try:
+    from lxml import etree as ET
+except ImportError:  # pragma: no cover - lxml is optional at runtime
+    import xml.etree.ElementTree as ET
+
+_HAS_LXML = hasattr(ET, "LXML_VERSION")
+
+# lxml refuses text nodes above 10 MB by default; templates may embed large images
+_PARSER = ET.XMLParser(huge_tree=True) if _HAS_LXML else None
+
+# Case-insensitive marker for label text, scanned without lowercasing a copy
+_TXT_RE = re.compile(r'txt', re.IGNORECASE)
+
+# Placeholders substituted into compiled page templates
+_PLACEHOLDER_PREFIX = '__GB_'
+_PLACEHOLDER_RE = re.compile(r'__GB_(LABEL|HREF)_(\d{3,})__')
+# Escapes match the backend's serializer byte for byte: the stdlib one leaves
+# '\r' raw in text and writes tabs in attributes as '&#09;'
+_TEXT_ESCAPES = str.maketrans(
+    {'&': '&amp;', '<': '&lt;', '>': '&gt;', **({'\r': '&#13;'} if _HAS_LXML else {})}
+)
+_ATTR_ESCAPES = str.maketrans({
+    '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;',
+    '\n': '&#10;', '\r': '&#13;', '\t': '&#9;' if _HAS_LXML else '&#09;',
+})
+
+def _placeholder(kind: str, position: int) -> str:
+    """Return the placeholder marking one group's label or href in a page template"""
+    return f"{_PLACEHOLDER_PREFIX}{kind}_{position:03d}__"
+
+def _write_svg_bytes(output_path: Path, data: bytes):
+    """Write serialized SVG markup, gzip-compressing .svgz paths"""
+    if output_path.suffix == '.svgz':
+        data = gzip.compress(data)
+    output_path.write_bytes(data)
+
+_NAMESPACES = {
+    'svg': 'http://www.w3.org/2000/svg',
+    'xlink': 'http://www.w3.org/1999/xlink'
+}
+
+# Register XML namespaces once to avoid ns0: prefixes
+for _prefix, _uri in _NAMESPACES.items():
+    ET.register_namespace(_prefix, _uri)
+
+_SVG_NS = '{http://www.w3.org/2000/svg}'
+_TAG_G = _SVG_NS + 'g'
+_TAG_TEXT = _SVG_NS + 'text'
+_TAG_IMAGE = _SVG_NS + 'image'
+_TAG_TSPAN = _SVG_NS + 'tspan'
+
+# Tag -> local name, seeded with the SVG tags the tokenizer dispatches on
+_LOCAL_NAMES: Dict[Any, str] = {
+    _TAG_G: 'g', 'g': 'g',
+    _TAG_TEXT: 'text', 'text': 'text',
+    _TAG_IMAGE: 'image', 'image': 'image',
+    _TAG_TSPAN: 'tspan', 'tspan': 'tspan',
+}
+
+def _local_name(tag: Any) -> str:
+    """Return the tag name without its namespace (comments/PIs yield an empty string)"""
+    name = _LOCAL_NAMES.get(tag)
+    if name is None:
+        name = tag.rpartition('}')[2] if isinstance(tag, str) else ""
+        _LOCAL_NAMES[tag] = name
+    return name
+
+@dataclass(slots=True)
 class SVGToken:
     """Represents a tokenized element from an SVG group"""
     type: str  # "label", "image", "other"
-    content: str
+    content: Optional[str]  # None defers serialization of "other" elements
     element: Optional[ET.Element] = None
     position: int = 0
-    original_content: str = field(default="")
+    original_content: Optional[str] = field(default="")
+    # Pristine copy of the element, taken the first time a label/image token is modified
+    snapshot: Optional[ET.Element] = field(default=None, repr=False, compare=False)
     
     def __post_init__(self):
         if not self.original_content:
             self.original_content = self.content
+    
+    @property
+    def content_str(self) -> str:
+        """Get the content, serializing a deferred element on first access"""
+        if self.content is None:
+            self.content = self._serialize_element()
+        return self.content
+    
+    @property
+    def original_content_str(self) -> str:
+        """Get the original content, serializing a deferred element on first access"""
+        if self.original_content is None:
+            self.original_content = self._serialize_element()
+        return self.original_content
+    
+    def _serialize_element(self) -> str:
+        """Serialize the underlying element to markup"""
+        if self.element is None:
+            return ""
+        return ET.tostring(self.element, encoding='unicode')
 
-@dataclass
+@dataclass(slots=True)
 class GroupMatch:
     """Represents a matched SVG group with its tokens"""
     element: ET.Element
     tokens: List[SVGToken]
     position: int
     group_id: str = ""
+    label_tokens: List[SVGToken] = field(init=False, repr=False, compare=False)
+    image_tokens: List[SVGToken] = field(init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        # Token types never change after tokenizing, so filter once up front
+        self.label_tokens = self.get_tokens_by_type("label")
+        self.image_tokens = self.get_tokens_by_type("image")
     
     def get_tokens_by_type(self, token_type: str) -> List[SVGToken]:
         """Get all tokens of a specific type"""
@@ -32,30 +129,24 @@ class GroupMatch:
     
     def get_label_tokens(self) -> List[SVGToken]:
         """Get all label tokens"""
-        return self.get_tokens_by_type("label")
+        return self.label_tokens.copy()
     
     def get_image_tokens(self) -> List[SVGToken]:
         """Get all image tokens"""
-        return self.get_tokens_by_type("image")
+        return self.image_tokens.copy()
 
 class SVGTokenizer:
     """Main SVG tokenizer class for parsing and modifying SVG files"""
     
+    # Shared by all instances; registered with ET once at import time
+    namespaces = _NAMESPACES
+    
     def __init__(self, svg_path: Union[str, Path]):
         self.svg_path = Path(svg_path)
         self.tree: Optional[ET.ElementTree] = None
         self.root: Optional[ET.Element] = None
         self.matched_groups: List[GroupMatch] = []
-        self.namespaces = {
-            'svg': 'http://www.w3.org/2000/svg',
-            'xlink': 'http://www.w3.org/1999/xlink'
-        }
-        self._register_namespaces()
-    
-    def _register_namespaces(self):
-        """Register XML namespaces to avoid ns0: prefixes"""
-        for prefix, uri in self.namespaces.items():
-            ET.register_namespace(prefix, uri)
+        self._groups_by_position: Dict[int, GroupMatch] = {}
     
     def parse_and_tokenize(self) -> 'SVGTokenizer':
         """Parse SVG file and tokenize eligible groups"""
@@ -63,19 +154,34 @@ class SVGTokenizer:
             raise FileNotFoundError(f"SVG file not found: {self.svg_path}")
         
         try:
-            self.tree = ET.parse(self.svg_path)
+            self.tree = ET.parse(str(self.svg_path), _PARSER)
             self.root = self.tree.getroot()
         except ET.ParseError as e:
             raise ValueError(f"Invalid SVG file: {e}")
         
+        return self._tokenize_tree()
+    
+    def clone(self) -> 'SVGTokenizer':
+        """Return an independent copy of the parsed template without touching the disk"""
+        if self.tree is None:
+            raise ValueError("SVG has not been parsed yet")
+        
+        clone = SVGTokenizer(self.svg_path)
+        clone.tree = copy.deepcopy(self.tree)
+        clone.root = clone.tree.getroot()
+        return clone._tokenize_tree()
+    
+    def _tokenize_tree(self) -> 'SVGTokenizer':
+        """Tokenize eligible groups of the currently loaded tree"""
         # Clear previous results
         self.matched_groups.clear()
+        self._groups_by_position.clear()
         
         # Find and process eligible groups
         eligible_groups = self._find_eligible_groups()
         
-        for i, group in enumerate(eligible_groups):
-            tokens = self._tokenize_group(group)
+        for i, (group, text_contents) in enumerate(eligible_groups):
+            tokens = self._tokenize_group(group, text_contents)
             group_match = GroupMatch(
                 element=group,
                 tokens=tokens,
@@ -83,106 +189,121 @@ class SVGTokenizer:
                 group_id=f"group_{i:03d}"
             )
             self.matched_groups.append(group_match)
+            self._groups_by_position[i] = group_match
         
         return self
     
-    def _find_eligible_groups(self) -> List[ET.Element]:
-        """Find groups that meet the eligibility criteria"""
+    def _find_eligible_groups(self) -> List[Tuple[ET.Element, Dict[int, str]]]:
+        """Find groups that meet the eligibility criteria, with the text contents read while checking them"""
         eligible_groups = []
+        if self.root is None:
+            return eligible_groups
         
-        def is_eligible_group(group: ET.Element) -> bool:
-            """Check if a group meets the eligibility criteria"""
-            # Rule 1: Group must NOT contain child groups
-            for child in group:
-                if self._is_group_element(child):
-                    return False
-            
-            # Rule 2: Must have direct <text> and <image> children
+        # Walk groups nested directly in groups, in document order, without recursion
+        local_name = _local_name
+        extract_text = self._extract_text_content
+        is_target = self._contains_target_identifier
+        pending = [child for child in reversed(self.root) if local_name(child.tag) == 'g']
+        while pending:
+            group = pending.pop()
+            child_groups = []
             has_eligible_text = False
             has_image = False
+            text_contents = {}
             
-            for child in group:
-                if self._is_text_element(child):
-                    text_content = self._extract_text_content(child)
-                    if self._contains_target_identifier(text_content):
-                        has_eligible_text = True
-                elif self._is_image_element(child):
+            # Single pass over the children collects nested groups and both rule flags
+            for index, child in enumerate(group):
+                name = local_name(child.tag)
+                if name == 'g':
+                    child_groups.append(child)
+                elif child_groups:
+                    # Rule 1 already failed, only nested groups matter from here on
+                    continue
+                elif name == 'image':
                     has_image = True
+                elif not has_eligible_text and name == 'text':
+                    text_contents[index] = extract_text(child)
+                    has_eligible_text = is_target(text_contents[index])
             
-            return has_eligible_text and has_image
-        
-        def traverse_groups(element: ET.Element):
-            """Recursively traverse and collect eligible groups"""
-            for child in element:
-                if self._is_group_element(child):
-                    if is_eligible_group(child):
-                        eligible_groups.append(child)
-                    # Continue traversing even if this group is eligible
-                    traverse_groups(child)
-        
-        if self.root is not None:
-            traverse_groups(self.root)
+            # Rule 1: no child groups; Rule 2: direct <text> and <image> children
+            if not child_groups and has_eligible_text and has_image:
+                eligible_groups.append((group, text_contents))
+            
+            # Continue traversing even if this group is eligible
+            pending.extend(reversed(child_groups))
         
         return eligible_groups
     
-    def _tokenize_group(self, group: ET.Element) -> List[SVGToken]:
-        """Convert group elements into tokens"""
-        tokens = []
-        position = 0
-        
-        for child in group:
-            token = self._create_token_from_element(child, position)
-            if token:
-                tokens.append(token)
-                position += 1
-        
-        return tokens
-    
-    def _create_token_from_element(self, element: ET.Element, position: int) -> Optional[SVGToken]:
+    def _tokenize_group(self, group: ET.Element, text_contents: Optional[Dict[int, str]] = None) -> List[SVGToken]:
+        """Convert group elements into tokens, reusing text contents already extracted by child index"""
+        text_contents = text_contents or {}
+        # Every child yields a token, so positions follow child order directly
+        create_token = self._create_token_from_element
+        return [
+            create_token(child, position, text_contents.get(position))
+            for position, child in enumerate(group)
+        ]
+    
+    def _create_token_from_element(self, element: ET.Element, position: int,
+                                   text_content: Optional[str] = None) -> Optional[SVGToken]:
         """Create a token from an XML element"""
-        if self._is_text_element(element):
+        factory = self._TOKEN_FACTORIES.get(_local_name(element.tag), SVGTokenizer._create_other_token)
+        return factory(self, element, position, text_content)
+    
+    def _create_text_token(self, element: ET.Element, position: int,
+                           text_content: Optional[str] = None) -> SVGToken:
+        """Create a label (or other) token from a text element"""
+        if text_content is None:
             text_content = self._extract_text_content(element)
-            token_type = "label" if self._contains_target_identifier(text_content) else "other"
-            
-            return SVGToken(
-                type=token_type,
-                content=text_content,
-                element=element,
-                position=position
-            )
+        token_type = "label" if self._contains_target_identifier(text_content) else "other"
         
-        elif self._is_image_element(element):
-            href = self._extract_image_href(element)
-            
-            return SVGToken(
-                type="image",
-                content=href,
-                element=element,
-                position=position
-            )
+        return SVGToken(
+            type=token_type,
+            content=text_content,
+            element=element,
+            position=position
+        )
+    
+    def _create_image_token(self, element: ET.Element, position: int,
+                            text_content: Optional[str] = None) -> SVGToken:
+        """Create an image token from an image element"""
+        href = self._extract_image_href(element)
         
-        else:
-            # Other elements
-            content = ET.tostring(element, encoding='unicode')
-            
-            return SVGToken(
-                type="other",
-                content=content,
-                element=element,
-                position=position
-            )
+        return SVGToken(
+            type="image",
+            content=href,
+            element=element,
+            position=position
+        )
+    
+    def _create_other_token(self, element: ET.Element, position: int,
+                            text_content: Optional[str] = None) -> SVGToken:
+        """Create a token for any other element"""
+        # Other elements are only serialized if their content is requested
+        return SVGToken(
+            type="other",
+            content=None,
+            element=element,
+            position=position
+        )
+    
+    # Local tag name -> token factory; anything else becomes an "other" token
+    _TOKEN_FACTORIES = {
+        'text': _create_text_token,
+        'image': _create_image_token,
+    }
     
     def _is_group_element(self, element: ET.Element) -> bool:
         """Check if element is a group"""
-        return element.tag.endswith('g')
+        return _local_name(element.tag) == 'g'
     
     def _is_text_element(self, element: ET.Element) -> bool:
         """Check if element is a text element"""
-        return element.tag.endswith('text')
+        return _local_name(element.tag) == 'text'
     
     def _is_image_element(self, element: ET.Element) -> bool:
         """Check if element is an image element"""
-        return element.tag.endswith('image')
+        return _local_name(element.tag) == 'image'
     
     def _extract_text_content(self, element: ET.Element) -> str:
         """Extract all text content from element including tspan"""
@@ -198,18 +319,15 @@ class SVGTokenizer:
     
     def _contains_target_identifier(self, text: str) -> bool:
         """Check if text contains the target identifier"""
-        return 'txt' in text.lower()
+        return _TXT_RE.search(text) is not None
     
     def get_matched_groups(self) -> List[GroupMatch]:
-        """Return all matched groups"""
-        return self.matched_groups.copy()
+        """Return all matched groups (the tokenizer's own list; treat it as read-only)"""
+        return self.matched_groups
     
     def get_group_by_position(self, position: int) -> Optional[GroupMatch]:
         """Get group by its position"""
-        for group in self.matched_groups:
-            if group.position == position:
-                return group
-        return None
+        return self._groups_by_position.get(position)
     
     def get_total_groups(self) -> int:
         """Get total number of matched groups"""
@@ -222,6 +340,9 @@ class SVGTokenizer:
     def modify_token(self, token: SVGToken, new_content: str) -> bool:
         """Modify a token's content"""
         try:
+            if token.type in ("label", "image") and token.snapshot is None and token.element is not None:
+                token.snapshot = copy.deepcopy(token.element)
+            
             if token.type == "label":
                 self._modify_text_token(token, new_content)
             elif token.type == "image":
@@ -242,21 +363,20 @@ class SVGTokenizer:
         if token.element is not None:
             # Check if there are tspan elements within the text element
             text_element = token.element
-            tspan_elements = [child for child in token.element if child.tag.endswith('tspan')]
+            tspan_elements = [child for child in token.element if _local_name(child.tag) == 'tspan']
             
             if tspan_elements:
-                # Replace content of the first tspan only
+                # Recolor #008080 to #000000 in the first child's style
+                first_child = text_element[0]
+                style = first_child.get("style")
+                if style and "#008080" in style:
+                    first_child.set("style", style.replace("#008080", "#000000"))
+                # Replace content of the first tspan only; clear() also drops attributes, so restore them
                 first_tspan = tspan_elements[0]
+                tspan_attribs = dict(first_tspan.attrib)
                 first_tspan.clear()
                 first_tspan.text = new_content
-                # Preserve text element attributes, replacing #008080 with #000000 in style
-                for key, value in text_element[0].attrib.items():
-                    if key == "style" and "#008080" in value:
-                        value = value.replace("#008080", "#000000")
-                    text_element[0].set(key, value)
-                # Preserve tspan attributes
-                for key, value in first_tspan.attrib.items():
-                    first_tspan.set(key, value)
+                first_tspan.attrib.update(tspan_attribs)
             else:
                 # Fallback: replace the whole text element content
                 # Store original attributes
@@ -292,7 +412,7 @@ class SVGTokenizer:
             return False
         
         success = True
-        for token in group.get_label_tokens():
+        for token in group.label_tokens:
             if not self.modify_token(token, new_label):
                 success = False
         
@@ -305,23 +425,36 @@ class SVGTokenizer:
             return False
         
         success = True
-        for token in group.get_image_tokens():
+        for token in group.image_tokens:
             if not self.modify_token(token, new_image_href):
                 success = False
         
         return success
     
+    def apply_batch(self, entries: Sequence[Tuple[int, Optional[str], Optional[str]]]) -> bool:
+        """Set the label and image href of many groups in one pass; None leaves that part as-is"""
+        success = True
+        for position, label, href in entries:
+            group = self._groups_by_position.get(position)
+            if group is None:
+                success = False
+                continue
+            if label is not None:
+                for token in group.label_tokens:
+                    success = self.modify_token(token, label) and success
+            if href is not None:
+                for token in group.image_tokens:
+                    success = self.modify_token(token, href) and success
+        
+        return success
+    
     def save_svg(self, output_path: Union[str, Path]) -> bool:
         """Save the modified SVG to file"""
         try:
             output_path = Path(output_path)
             
             if self.tree is not None:
-                self.tree.write(
-                    str(output_path),
-                    encoding='utf-8',
-                    xml_declaration=False
-                )
+                _write_svg_bytes(output_path, self.to_bytes())
                 return True
             return False
         
@@ -329,6 +462,21 @@ class SVGTokenizer:
             print(f"Error saving SVG: {e}")
             return False
     
+    def to_bytes(self) -> bytes:
+        """Serialize the current document as UTF-8 markup"""
+        if self.tree is None:
+            raise ValueError("SVG has not been parsed yet")
+        # lxml serializes the tree (doctype included), stdlib only has the root
+        return ET.tostring(
+            self.tree if _HAS_LXML else self.root,
+            encoding='utf-8',
+            xml_declaration=False
+        )
+    
+    def compile_page_template(self) -> 'SVGPageTemplate':
+        """Build a string template that fills every group's label and image per page"""
+        return SVGPageTemplate(self)
+    
     def export_structure(self, output_path: Union[str, Path] = None) -> Dict[str, Any]:
         """Export interoperable structure as JSON"""
         structure = self.get_interoperable_structure()
@@ -388,18 +536,26 @@ class SVGTokenizer:
         """Serialize a token for JSON export"""
         return {
             'type': token.type,
-            'content': token.content,
-            'original_content': token.original_content,
+            'content': token.content_str,
+            'original_content': token.original_content_str,
             'position': token.position,
             'group_position': group_position,
-            'modified': token.content != token.original_content
+            'modified': token.content_str != token.original_content_str
         }
     
     def reset_modifications(self):
         """Reset all tokens to their original content"""
         for group in self.matched_groups:
             for token in group.tokens:
-                if token.content != token.original_content:
+                if token.content == token.original_content:
+                    continue
+                if token.snapshot is not None:
+                    # Swap a copy of the pristine element back in; every child is a token, so position is its index
+                    restored = copy.deepcopy(token.snapshot)
+                    group.element[token.position] = restored
+                    token.element = restored
+                    token.content = token.original_content
+                else:
                     self.modify_token(token, token.original_content)
     
     def get_statistics(self) -> Dict[str, Any]:
@@ -415,6 +571,53 @@ class SVGTokenizer:
             )
         }
 
+class SVGPageTemplate:
+    """Serialized template whose group labels and image hrefs are filled by string substitution"""
+    
+    def __init__(self, tokenizer: SVGTokenizer):
+        if _PLACEHOLDER_PREFIX.encode() in tokenizer.to_bytes():
+            raise ValueError(f"SVG already contains the placeholder prefix {_PLACEHOLDER_PREFIX!r}")
+        
+        # Run the regular modify path once with placeholders, so pages match tree edits
+        page = tokenizer.clone()
+        self.positions = [group.position for group in page.matched_groups]
+        page.apply_batch([
+            (position, _placeholder('LABEL', position), _placeholder('HREF', position))
+            for position in self.positions
+        ])
+        self.template = page.to_bytes().decode('utf-8')
+    
+    def render(self, labels: Sequence[str], hrefs: Sequence[str]) -> str:
+        """Fill in one label and one image href per matched group, in position order"""
+        # A short list would leave raw placeholders in the page for the renderer to draw
+        if len(labels) != len(self.positions) or len(hrefs) != len(self.positions):
+            raise ValueError(
+                f"Expected {len(self.positions)} labels and hrefs, "
+                f"got {len(labels)} labels and {len(hrefs)} hrefs"
+            )
+        values = {}
+        for position, label, href in zip(self.positions, labels, hrefs):
+            values[('LABEL', position)] = label.translate(_TEXT_ESCAPES)
+            values[('HREF', position)] = href.translate(_ATTR_ESCAPES)
+        
+        # One scan over the template fills every placeholder
+        def fill(match: re.Match) -> str:
+            return values[(match.group(1), int(match.group(2)))]
+        
+        return _PLACEHOLDER_RE.sub(fill, self.template)
+    
+    def save_svg(self, output_path: Union[str, Path], labels: Sequence[str], hrefs: Sequence[str]) -> bool:
+        """Render a page and save it to file"""
+        # Rendered outside the try, so mismatched inputs raise instead of being reported as I/O errors
+        data = self.render(labels, hrefs).encode('utf-8')
+        try:
+            _write_svg_bytes(Path(output_path), data)
+            return True
+        
+        except Exception as e:
+            print(f"Error saving SVG: {e}")
+            return False
+
 # Convenience functions for simple usage
 def process_svg_file(input_path: Union[str, Path], output_path: Union[str, Path] = None) -> SVGTokenizer:
     """Process SVG file and return tokenizer instance"""
@@ -433,14 +636,11 @@ def quick_modify_svg(input_path: Union[str, Path], output_path: Union[str, Path]
     try:
         tokenizer = process_svg_file(input_path)
         
-        for i, group in enumerate(tokenizer.get_matched_groups(), 1):
-            # Modify labels
-            new_label = label_template.format(index=i)
-            tokenizer.modify_group_labels(group.position, new_label)
-            
-            # Modify images if href provided
-            if image_href:
-                tokenizer.modify_group_images(group.position, image_href)
+        # Relabel every group, and repoint images only if an href was provided
+        tokenizer.apply_batch([
+            (group.position, label_template.format(index=i), image_href or None)
+            for i, group in enumerate(tokenizer.get_matched_groups(), 1)
+        ])
         
         return tokenizer.save_svg(output_path)
     
@@ -1,7 +1,7 @@
 import os
 import sys
 import argparse
-import base64
+import binascii
 import json
 import math
 import random
@@ -10,52 +10,114 @@ from PIL import Image
 import io
 import bird
 import concurrent.futures
-import csv
-import gzip
+import multiprocessing
+import hashlib
+import sqlite3
 import threading
-import queue
 import re
+import functools
+import itertools
 
 PLACEHOLDER_TEXT_COLOR = "#008080ff"
 MAX_IMAGE_DIM = 512
 VERSION = "0.1.0"
 DEFAULT_SLICE_SIZE = None
-
-# Restrict CSV fields to at most 1 GiB to avoid excessive memory usage
-csv.field_size_limit(1024 * 1024 * 1024)
-
-# cairo prec
+IMAGE_EXTENSIONS = frozenset({"jpg", "jpeg", "png", "bmp", "gif"})
+
+JPEG_QUALITY = 85
+EXIF_ORIENTATION = 0x0112
+# Bump whenever encode_image output changes so stale encodings are dropped
+IMAGE_CACHE_VERSION = 5
+IMAGE_CACHE_MMAP_SIZE = 256 * 1024 * 1024
+# Seconds to wait for another process's lock on the image cache before giving up
+IMAGE_CACHE_TIMEOUT = 60
+# Final-pass resampling filters selectable with --resample
+RESAMPLE_FILTERS = {
+    "lanczos": Image.Resampling.LANCZOS,
+    "bicubic": Image.Resampling.BICUBIC,
+    "bilinear": Image.Resampling.BILINEAR,
+}
+DEFAULT_RESAMPLE = "bicubic"
+
+# cairo prec (cairosvg itself is imported by the PDF workers that use it)
 if os.name == "nt":
     os.environ["PATH"] += ";C:\\Program Files\\GTK3-Runtime Win64\\bin"
-import cairosvg
 
 if hasattr(sys.stdout, "reconfigure"):
     sys.stdout.reconfigure(encoding="utf-8")
     sys.stderr.reconfigure(encoding="utf-8")
 
 
-def process_image(image_path):
-    """Convert an image to a square ratio with a white background and return its data URL, scaling to fit the largest dimension."""
+# Per-thread white square canvas, reused while consecutive images share a size
+_CANVAS_POOL = threading.local()
+
+
+def get_white_canvas(size):
+    canvas = getattr(_CANVAS_POOL, "canvas", None)
+    if canvas is None or canvas.width != size:
+        canvas = _CANVAS_POOL.canvas = Image.new("RGB", (size, size), (255, 255, 255))
+    else:
+        # Clear in place instead of allocating a fresh image
+        canvas.paste((255, 255, 255), (0, 0, size, size))
+    return canvas
+
+
+def image_variant(resample=DEFAULT_RESAMPLE, jpeg_quality=JPEG_QUALITY, jpeg_optimize=False):
+    """Cache key for the encoding settings that, besides max_dim, shape encode_image output."""
+    return f"{resample}:q{jpeg_quality}" + (":opt" if jpeg_optimize else "")
+
+
+def jpeg_data_url(jpeg_bytes):
+    # Encode from a view of the bytes and stay in bytes until the single final decode
+    b64_img = binascii.b2a_base64(jpeg_bytes, newline=False)
+    return (b"data:image/jpeg;base64," + b64_img).decode("ascii")
+
+
+def encode_image(
+    image_path,
+    max_dim=MAX_IMAGE_DIM,
+    resample=DEFAULT_RESAMPLE,
+    jpeg_quality=JPEG_QUALITY,
+    jpeg_optimize=False,
+):
+    """Square an image onto a white background, downscaled so its largest dimension fits max_dim, and return the JPEG bytes."""
     with Image.open(image_path) as img:
-        img = img.convert("RGBA")
-        target_dim = MAX_IMAGE_DIM
-        # Scale so the largest dimension matches target_dim
-        scale = target_dim / max(img.width, img.height)
-        new_size = (round(img.width * scale), round(img.height * scale))
-        img = img.resize(new_size, Image.Resampling.LANCZOS)
-        # Create a white RGBA square background
-        square_bg = Image.new("RGBA", (target_dim, target_dim), (255, 255, 255, 255))
-        # Center the resized image on the square background
-        offset = ((target_dim - img.width) // 2, (target_dim - img.height) // 2)
-        temp_img = Image.new("RGBA", (target_dim, target_dim), (0, 0, 0, 0))
-        temp_img.paste(img, offset)
-        composed = Image.alpha_composite(square_bg, temp_img)
-        final_img = composed.convert("RGB")
+        if (
+            img.format == "JPEG"
+            and img.mode in ("RGB", "L")
+            and img.width == img.height <= max_dim
+            and img.getexif().get(EXIF_ORIENTATION, 1) == 1
+        ):
+            # Already a square JPEG within bounds: embed the file as-is instead of re-encoding
+            with open(image_path, "rb") as f:
+                return f.read()
+        if max(img.size) > max_dim:
+            # Let JPEG decode at a reduced DCT scale; keeps 2x headroom for the final resample (no-op for other formats)
+            img.draft("RGB", (max_dim * 2, max_dim * 2))
+        # Only images that can carry transparency need the RGBA path and an alpha-masked paste
+        img = img.convert("RGBA" if img.has_transparency_data else "RGB")
+        # Cap the largest dimension at max_dim; smaller images are left for the SVG renderer to scale.
+        # reducing_gap box-reduces by an integer factor first, so the filter only sees >= 2x the target
+        img.thumbnail((max_dim, max_dim), RESAMPLE_FILTERS[resample], reducing_gap=2.0)
+        target_dim = max(img.width, img.height)
+        if img.mode == "RGB" and img.width == img.height:
+            # Opaque and already square: nothing to compose
+            final_img = img
+        else:
+            # Center the resized image on a white RGB square, blending through its own alpha
+            final_img = get_white_canvas(target_dim)
+            offset = ((target_dim - img.width) // 2, (target_dim - img.height) // 2)
+            final_img.paste(img, offset, mask=img if img.mode == "RGBA" else None)
         img_bytes = io.BytesIO()
-        final_img.save(img_bytes, format="JPEG", quality=90, optimize=True)
-        img_bytes = img_bytes.getvalue()
-        b64_img = base64.b64encode(img_bytes).decode("utf-8")
-        return f"data:image/jpg;base64,{b64_img}"
+        # 4:2:0 chroma keeps payloads small; the extra Huffman optimization pass is opt-in
+        final_img.save(
+            img_bytes,
+            format="JPEG",
+            quality=jpeg_quality,
+            optimize=jpeg_optimize,
+            subsampling=2,
+        )
+        return img_bytes.getvalue()
 
 
 def discover_image_sets(root_path):
@@ -64,18 +126,38 @@ def discover_image_sets(root_path):
     image_sets = {}
     total_files = 0
 
-    for dirpath, dirnames, filenames in os.walk(root_path):
+    # Same top-down order as os.walk, but each directory is listed with a single
+    # scandir and the entries' cached type info, without following symlinked dirs
+    root_name = os.path.basename(root_path)
+    pending = [root_path]
+    while pending:
+        dirpath = pending.pop()
+        try:
+            with os.scandir(dirpath) as it:
+                entries = list(it)
+        except OSError:
+            continue
+
+        subdirs = []
+        image_files = []
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                if not entry.is_symlink():
+                    subdirs.append(entry.path)
+                continue
+            # Filter image files, keeping each label from the same split as splitext()
+            stem, _, ext = entry.name.rpartition(".")
+            if stem.strip(".") and ext.lower() in IMAGE_EXTENSIONS:
+                image_files.append((entry.path, entry.name, stem, get_entry_signature(entry)))
+        pending.extend(reversed(subdirs))
+
         set_name = os.path.basename(dirpath)
-        if set_name == os.path.basename(root_path):
+        if set_name == root_name:
             continue  # Skip the root directory itself
-
-        # Filter image files
-        image_files = [
-            f
-            for f in filenames
-            if os.path.splitext(f)[1].lstrip(".").lower()
-            in ["jpg", "jpeg", "png", "bmp", "gif"]
-        ]
         if not image_files:
             continue
 
@@ -86,11 +168,12 @@ def discover_image_sets(root_path):
 
         image_sets[set_name] = [
             {
-                "file_path": os.path.join(dirpath, f),
-                "label": os.path.splitext(f)[0],
+                "file_path": file_path,
+                "label": stem,
                 "original_name": f,
+                "signature": signature,
             }
-            for f in image_files
+            for file_path, f, stem, signature in image_files
         ]
         total_files += len(image_files)
 
@@ -99,146 +182,255 @@ def discover_image_sets(root_path):
     return image_sets
 
 
-def get_image_cache_csv(cache_path):
-    cache = {}
-    if os.path.exists(cache_path):
+def open_image_cache(cache_path):
+    """Open the SQLite image cache, replacing an unreadable or legacy (gzip CSV) file.
+
+    Only a file that is not a database or is corrupt gets replaced; a locked,
+    read-only or otherwise unavailable cache raises instead of being deleted.
+    """
+    for attempt in range(2):
+        conn = sqlite3.connect(cache_path, timeout=IMAGE_CACHE_TIMEOUT)
         try:
-            with gzip.open(cache_path, "rt", encoding="utf-8", newline="") as f:
-                reader = csv.reader(f)
-                for row in reader:
-                    if len(row) != 3:
-                        continue
-                    file_path, mtime_str, data_url = row
-                    if not file_path:
-                        continue
-                    try:
-                        mtime = int(mtime_str)
-                    except (TypeError, ValueError):
-                        try:
-                            mtime = int(round(float(mtime_str) * 1000))
-                        except (TypeError, ValueError):
-                            mtime = None
-                    cache[file_path] = (mtime, data_url)
-        except Exception as e:
-            print(f"Failed to read image cache: {e}")
-            exit(1)
-    return cache
-
-
-# def append_image_cache_csv(cache_path, file_path, mtime, data_url):
-#     try:
-#         with gzip.open(cache_path, 'at', encoding='utf-8', newline='') as f:
-#             writer = csv.writer(f)
-#             writer.writerow([file_path, mtime, data_url])
-#     except Exception as e:
-#         print(f"Failed to append to image cache: {e}")
-
-
-def wal_writer_thread(cache_path, wal_queue, stop_event):
-    with gzip.open(cache_path, "at", encoding="utf-8", newline="") as f:
-        csv_writer = csv.writer(f)
-        while not stop_event.is_set() or not wal_queue.empty():
-            try:
-                entry = wal_queue.get(timeout=0.1)
-                if entry is None:
-                    break
-                file_path, mtime, data_url = entry
-                mtime_value = "" if mtime is None else str(mtime)
-                csv_writer.writerow([file_path, mtime_value, data_url])
-                f.flush()
-                wal_queue.task_done()
-            except queue.Empty:
-                continue
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            # Serve BLOB reads from a memory map instead of copying through the page cache
+            conn.execute(f"PRAGMA mmap_size = {IMAGE_CACHE_MMAP_SIZE}")
+            with conn:
+                (version,) = conn.execute("PRAGMA user_version").fetchone()
+                if version != IMAGE_CACHE_VERSION:
+                    # Encodings from other encode_image settings are stale; file digests still hold
+                    conn.execute("DROP TABLE IF EXISTS images")
+                    conn.execute(f"PRAGMA user_version = {IMAGE_CACHE_VERSION}")
+                # files: what a path looked like when hashed; images: encoded JPEG per content,
+                # stored raw and only base64-encoded into a data URL when looked up
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS files ("
+                    "path TEXT PRIMARY KEY, mtime INTEGER, size INTEGER, digest TEXT NOT NULL)"
+                )
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS images ("
+                    "digest TEXT NOT NULL, max_dim INTEGER NOT NULL, variant TEXT NOT NULL, "
+                    "jpeg BLOB NOT NULL, PRIMARY KEY (digest, max_dim, variant))"
+                )
+            return conn
+        except sqlite3.DatabaseError as e:
+            conn.close()
+            if attempt or e.sqlite_errorname not in ("SQLITE_NOTADB", "SQLITE_CORRUPT"):
+                raise
+            print(f"Discarding unreadable image cache: {e}")
+            for suffix in ("", "-wal", "-shm"):
+                try:
+                    os.remove(cache_path + suffix)
+                except FileNotFoundError:
+                    pass
 
 
-def get_normalized_mtime(image_path):
+def _stat_signature(st):
+    return int(round(st.st_mtime * 1000)), st.st_size
+
+
+def get_file_signature(image_path):
+    """Return ``(mtime_ms, size)``, or ``(None, None)`` if the file can't be stat'ed."""
     try:
-        return int(round(os.path.getmtime(image_path) * 1000))
-    except Exception:
+        return _stat_signature(os.stat(image_path))
+    except OSError:
+        return None, None
+
+
+def get_entry_signature(entry):
+    """Like get_file_signature, for an os.DirEntry (stat comes from the directory listing on Windows)."""
+    try:
+        return _stat_signature(entry.stat())
+    except OSError:
+        return None, None
+
+
+def get_file_digest(image_path):
+    try:
+        with open(image_path, "rb") as f:
+            return hashlib.file_digest(f, "sha256").hexdigest()
+    except OSError:
         return None
 
 
-def process_image_with_cache(image_path, cache, cache_path, wal_queue=None):
-    mtime = get_normalized_mtime(image_path)
-    cache_entry = cache.get(image_path)
-    if cache_entry is not None:
-        cached_mtime, data_url = cache_entry
-        if cached_mtime == mtime:
-            return data_url
-    data_url = process_image(image_path)
-    cache[image_path] = (mtime, data_url)
-    if wal_queue is not None:
-        wal_queue.put((image_path, mtime, data_url))
-    # else:
-    #     append_image_cache_csv(cache_path, image_path, mtime, data_url)
-    return data_url
-
-
-def process_image_with_index(args):
-    img_info, idx, total, set_name, cache, cache_path, wal_queue = args
-    data_url = process_image_with_cache(
-        img_info["file_path"], cache, cache_path, wal_queue
-    )
-    return (
-        {
-            "label": img_info["label"],
-            "image": data_url,
-            "original_name": img_info["original_name"],
-        },
-        idx - 1,
-    )  # -1 because idx starts from 1
+def lookup_cached_digest(conn, image_path, signature=None):
+    """Return ``(digest, (mtime, size))``; digest is None unless path, mtime and size are unchanged."""
+    mtime, size = signature or get_file_signature(image_path)
+    row = conn.execute(
+        "SELECT mtime, size, digest FROM files WHERE path = ?", (image_path,)
+    ).fetchone()
+    if row is not None and mtime is not None and row[:2] == (mtime, size):
+        return row[2], (mtime, size)
+    return None, (mtime, size)
+
+
+def lookup_processed_image(conn, digest, max_dim=MAX_IMAGE_DIM, variant=None):
+    found = conn.execute(
+        "SELECT jpeg FROM images WHERE digest = ? AND max_dim = ? AND variant = ?",
+        (digest, max_dim, variant or image_variant()),
+    ).fetchone()
+    return jpeg_data_url(found[0]) if found else None
+
+
+def store_file_digests(conn, rows):
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO files (path, mtime, size, digest) VALUES (?, ?, ?, ?)",
+            rows,
+        )
+
+
+def store_processed_images(conn, rows):
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO images (digest, max_dim, variant, jpeg) "
+            "VALUES (?, ?, ?, ?)",
+            rows,
+        )
+
+
+def connect_image_cache_writer(cache_path):
+    """Open a worker's connection to an image cache created by open_image_cache."""
+    # WAL lets workers commit while the parent reads; wait out each other's write locks
+    conn = sqlite3.connect(cache_path, timeout=IMAGE_CACHE_TIMEOUT)
+    # Per-connection setting: without it each commit would fsync the -wal file
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def process_image_batch(tasks):
+    """Worker entry point: process a batch of images and store them in the cache.
+
+    Each batch is written in a single transaction. Returns one
+    ``(key, digest, data_url)`` per task; ``data_url`` is only sent back when the
+    image couldn't be cached, so bulk data stays out of the result pipe.
+    """
+    results = []
+    rows = []
+    for key, digest, image_path, max_dim, encode_options, cache_path in tasks:
+        jpeg_bytes = encode_image(image_path, max_dim, *encode_options)
+        if digest is None:
+            results.append((key, digest, jpeg_data_url(jpeg_bytes)))
+            continue
+        rows.append((digest, max_dim, image_variant(*encode_options), jpeg_bytes))
+        results.append((key, digest, None))
+    if rows:
+        conn = connect_image_cache_writer(cache_path)
+        try:
+            store_processed_images(conn, rows)
+        finally:
+            conn.close()
+    return results
+
 
+def _is_label_junk(part):
+    # Empty, a single number, or a single character
+    return len(part) <= 1 or part.isdigit()
 
+
+# Copies and placeholder padding repeat the same labels across many slots
+@functools.lru_cache(maxsize=4096)
 def filter_label(label: str) -> str:
-    # Trim the label
-    label = label.strip()
-    # Split by ., ,, _, -
-    parts = re.split(r"[.,_\-]", label)
-    # Trim each part
-    parts = [p.strip() for p in parts]
-    # Remove first part if it's empty, a single number, or a single character
-    if parts and (parts[0] == "" or (len(parts[0]) == 1) or parts[0].isdigit()):
-        parts = parts[1:]
-    # Remove last part if it's empty, a single number, or a single character
-    if parts and (parts[-1] == "" or (len(parts[-1]) == 1) or parts[-1].isdigit()):
-        parts = parts[:-1]
-    # Join with space
-    return " ".join(parts)
-
-
-def process_image_sets(image_sets, cache_path="./tmp/.imgcache"):
-    print("\n=== Processing Images (Parallel, with WAL CSV cache via queue) ===")
+    # Split by ., ,, _, - (folded onto "." with plain replaces, cheaper than a regex
+    # split for short labels) and trim each part, which also trims the label's ends
+    folded = label.replace(",", ".").replace("_", ".").replace("-", ".")
+    parts = [p.strip() for p in folded.split(".")]
+    # Drop at most one junk part from each end and join the rest with spaces,
+    # slicing once instead of rebuilding the list per end
+    start = 1 if _is_label_junk(parts[0]) else 0
+    end = len(parts)
+    if end > start and _is_label_junk(parts[-1]):
+        end -= 1
+    return " ".join(parts[start:end])
+
+
+def process_image_sets(
+    image_sets,
+    cache_path="./tmp/.imgcache",
+    max_dim=MAX_IMAGE_DIM,
+    resample=DEFAULT_RESAMPLE,
+    jpeg_quality=JPEG_QUALITY,
+    jpeg_optimize=False,
+):
+    print("\n=== Processing Images (Process pool, with SQLite cache) ===")
     processed_sets = {}
-    cache = get_image_cache_csv(cache_path)
-    wal_queue = queue.Queue()
-    stop_event = threading.Event()
-    writer_thread = threading.Thread(
-        target=wal_writer_thread, args=(cache_path, wal_queue, stop_event)
-    )
-    writer_thread.start()
+    encode_options = (resample, jpeg_quality, jpeg_optimize)
+    variant = image_variant(*encode_options)
+    conn = open_image_cache(cache_path)
     try:
-        with concurrent.futures.ThreadPoolExecutor(max_workers=24) as executor:
-            for set_name, images in image_sets.items():
-                total = len(images)
-                futures = []
-                for idx, img_info in enumerate(images, 1):
-                    future = executor.submit(
-                        process_image_with_index,
-                        (img_info, idx, total, set_name, cache, cache_path, wal_queue),
-                    )
-                    futures.append(future)
-                results = []
-                for future in concurrent.futures.as_completed(futures):
-                    result, original_idx = future.result()
-                    results.append((original_idx, result))
-                processed_sets[set_name] = [
-                    r[1] for r in sorted(results, key=lambda x: x[0])
-                ]
-        wal_queue.join()
+        # First pass only stats files; unchanged files are resolved from the cache right away
+        unresolved = []
+        for set_name, images in image_sets.items():
+            results = []
+            for idx, img_info in enumerate(images):
+                image_path = img_info["file_path"]
+                digest, signature = lookup_cached_digest(
+                    conn, image_path, img_info.get("signature")
+                )
+                data_url = None
+                if digest is not None:
+                    data_url = lookup_processed_image(conn, digest, max_dim, variant)
+                if data_url is None:
+                    unresolved.append((set_name, idx, image_path, digest, signature))
+                results.append(
+                    {
+                        "label": img_info["label"],
+                        "image": data_url,
+                        "original_name": img_info["original_name"],
+                    }
+                )
+            processed_sets[set_name] = results
+        if not unresolved:
+            return processed_sets
+        # All sets share one flat queue; biggest files go first so no large image
+        # is left running alone at the end while the other workers sit idle
+        unresolved.sort(key=lambda entry: entry[4][1] or 0, reverse=True)
+
+        pending = {}
+        file_rows = []
+
+        def iter_tasks():
+            # Hashing reads each new or changed file; yielding tasks as we go lets the
+            # workers encode earlier images while later ones are still being read
+            for set_name, idx, image_path, digest, (mtime, size) in unresolved:
+                if digest is None:
+                    digest = get_file_digest(image_path)
+                    if digest is not None:
+                        file_rows.append((image_path, mtime, size, digest))
+                        data_url = lookup_processed_image(conn, digest, max_dim, variant)
+                        if data_url is not None:
+                            processed_sets[set_name][idx]["image"] = data_url
+                            continue
+                # Misses go to the workers once per distinct content
+                key = digest or image_path
+                if key not in pending:
+                    pending[key] = []
+                    yield key, digest, image_path, max_dim, encode_options, cache_path
+                pending[key].append((set_name, idx))
+
+        # Don't spawn interpreters that could never receive a task
+        workers = min(os.cpu_count() or 1, len(unresolved))
+        # Amortize IPC and cache commits over a few tasks per batch while leaving
+        # ~4 batches per worker to balance
+        batch_size = max(1, min(32, len(unresolved) // (4 * workers)))
+        # Spawn rather than fork: the parent holds an open connection to the same
+        # database, which SQLite says must not be carried into a child process
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            for results in executor.map(
+                process_image_batch, itertools.batched(iter_tasks(), batch_size)
+            ):
+                for key, digest, data_url in results:
+                    if data_url is None:
+                        # The worker committed it; read it back from the cache
+                        data_url = lookup_processed_image(conn, digest, max_dim, variant)
+                    for set_name, idx in pending[key]:
+                        processed_sets[set_name][idx]["image"] = data_url
+        if file_rows:
+            store_file_digests(conn, file_rows)
     finally:
-        stop_event.set()
-        wal_queue.put(None)
-        writer_thread.join()
+        conn.close()
     return processed_sets
 
 
@@ -296,18 +488,25 @@ def make_slices(images, slice_size, set_name, placeholder, set_lookup):
     for i in range(0, len(images), slice_size):
         chunk = list(images[i : i + slice_size])
         if len(chunk) < slice_size:
-            padding = [
-                build_placeholder_card(
-                    placeholder, set_name=set_name, set_lookup=set_lookup
-                )
-                for _ in range(slice_size - len(chunk))
-            ]
-            chunk.extend(padding)
+            # Placeholder cards are only read downstream, so one dict fills every padding slot
+            padding = build_placeholder_card(
+                placeholder, set_name=set_name, set_lookup=set_lookup
+            )
+            chunk.extend([padding] * (slice_size - len(chunk)))
         slices.append({"set": set_name, "items": chunk})
     return slices
 
 
-def discover_and_process_images(root_path, cache_path, onepixel, stats=None):
+def discover_and_process_images(
+    root_path,
+    cache_path,
+    onepixel,
+    stats=None,
+    max_dim=MAX_IMAGE_DIM,
+    resample=DEFAULT_RESAMPLE,
+    jpeg_quality=JPEG_QUALITY,
+    jpeg_optimize=False,
+):
     image_sets = discover_image_sets(root_path)
     if not image_sets:
         print("\nNo image sets found!")
@@ -317,18 +516,25 @@ def discover_and_process_images(root_path, cache_path, onepixel, stats=None):
             stats["status"] = "error"
             stats["error"] = "No image sets found."
         return None
-    processed_sets = process_image_sets(image_sets, cache_path=cache_path)
+    processed_sets = process_image_sets(
+        image_sets,
+        cache_path=cache_path,
+        max_dim=max_dim,
+        resample=resample,
+        jpeg_quality=jpeg_quality,
+        jpeg_optimize=jpeg_optimize,
+    )
     if stats is not None:
         stats["sets"] = len(processed_sets)
         stats["images"] = sum(len(images) for images in processed_sets.values())
     return processed_sets
 
 
-def load_template_info(template_path, stats=None):
-    tokenizer = bird.SVGTokenizer(template_path)
-    tokenizer.parse_and_tokenize()
-    groups = tokenizer.get_matched_groups()
-    slots_per_page = len(groups)
+def load_template_info(template_path, stats=None, template=None):
+    # Parsed once per run (unless the caller already did); page rendering reuses this tokenizer
+    if template is None:
+        template = bird.SVGTokenizer(template_path).parse_and_tokenize()
+    slots_per_page = template.get_total_groups()
     slice_size = DEFAULT_SLICE_SIZE
     try:
         with open(template_path, "r", encoding="utf-8") as f:
@@ -346,7 +552,7 @@ def load_template_info(template_path, stats=None):
     if stats is not None:
         stats["slots_per_page"] = slots_per_page
         stats["slice_size"] = slice_size
-    return tokenizer, groups, slots_per_page, slice_size
+    return template, slots_per_page, slice_size
 
 
 def collect_all_slices(processed_sets, slice_size, placeholder, set_lookup):
@@ -447,7 +653,7 @@ def build_placeholder_card(placeholder, set_name=None, set_lookup=None):
 
 
 def build_space_entry(item, slot_index, stack_index, cell_index, extra=None):
-    meta = dict(item.get("_meta") or {})
+    meta = item.get("_meta") or {}
     entry = {
         "slot": slot_index,
         "stack": stack_index,
@@ -556,14 +762,10 @@ def group_slices_into_pages(
 
     page_count = math.ceil(total_slices / slices_per_page)
 
+    placeholder_card = build_placeholder_card(placeholder, set_lookup=set_lookup)
+
     def make_placeholder_slice():
-        return {
-            "set": None,
-            "items": [
-                build_placeholder_card(placeholder, set_lookup=set_lookup)
-                for _ in range(slice_size)
-            ],
-        }
+        return {"set": None, "items": [placeholder_card] * slice_size}
 
     slice_index = 0
 
@@ -575,18 +777,15 @@ def group_slices_into_pages(
             return slice_
         return make_placeholder_slice()
 
-    page_rows = [
-        [make_placeholder_slice() for _ in range(slices_per_page)]
-        for _ in range(page_count)
-    ]
+    # stack_count * rows_per_stack == slices_per_page, so every row below is
+    # assigned exactly once; no need to pre-fill pages with placeholder slices
+    page_rows = [[None] * slices_per_page for _ in range(page_count)]
 
     for stack_idx in range(stack_count):
-        for page_idx in range(page_count):
-            for row_pos in range(rows_per_stack):
-                row_index = stack_idx * rows_per_stack + row_pos
-                if row_index >= slices_per_page:
-                    continue
-                page_rows[page_idx][row_index] = take_slice()
+        first_row = stack_idx * rows_per_stack
+        for rows in page_rows:
+            for row_index in range(first_row, first_row + rows_per_stack):
+                rows[row_index] = take_slice()
 
     if slice_index < total_slices:
         raise RuntimeError("Failed to allocate all slices into naive parity layout")
@@ -599,15 +798,11 @@ def group_slices_into_pages(
         for row_idx, slice_ in enumerate(rows):
             slice_items = slice_["items"]
             row_set_name = slice_.get("set")
+            stack_index, row_position = divmod(row_idx, rows_per_stack)
+            first_cell = row_position * slice_size
             for column_idx, item in enumerate(slice_items):
                 slot_index = len(items)
-                if stack_count > 1:
-                    stack_index = row_idx // rows_per_stack
-                    row_position = row_idx % rows_per_stack
-                else:
-                    stack_index = 0
-                    row_position = row_idx
-                cell_index = row_position * slice_size + column_idx
+                cell_index = first_cell + column_idx
                 items.append(item)
                 space.append(
                     build_space_entry(
@@ -664,6 +859,8 @@ def build_cell_stack_page_plans(
     total_cards = sum(len(images) for _, images in ordered_sets)
     page_plans = []
     cell_stack_groups = 0
+    # One shared, read-only placeholder card per set (None for empty cells)
+    placeholder_cards = {}
 
     for group_index, group in enumerate(chunked(ordered_sets, cells_per_page)):
         cell_stack_groups += 1
@@ -685,9 +882,11 @@ def build_cell_stack_page_plans(
                     if set_name is not None and card_index < len(images):
                         item = images[card_index]
                     else:
-                        item = build_placeholder_card(
-                            placeholder, set_name=set_name, set_lookup=set_lookup
-                        )
+                        item = placeholder_cards.get(set_name)
+                        if item is None:
+                            item = placeholder_cards[set_name] = build_placeholder_card(
+                                placeholder, set_name=set_name, set_lookup=set_lookup
+                            )
                     slot_index = len(page_items)
                     page_items.append(item)
                     page_space.append(
@@ -718,16 +917,15 @@ def build_cell_stack_page_plans(
     return page_plans
 
 
-def create_svg_pages(
-    page_plans, template_path, slots_per_page, onepixel, svg_dir, stats=None
+def iter_svg_pages(
+    page_plans, template, slots_per_page, onepixel, svg_dir, stats=None
 ):
-    svg_pdf_pairs = []
+    """Write SVG pages one at a time, yielding each ``(svg, pdf)`` pair once it is saved."""
+    page_count = 0
     page_counter = 1
     pages_meta = [] if stats is not None else None
+    page_template = template.compile_page_template()
     for page_idx, plan in enumerate(page_plans):
-        tokenizer = bird.SVGTokenizer(template_path)
-        tokenizer.parse_and_tokenize()
-        groups = tokenizer.get_matched_groups()
         page_items = list(plan.items)
         if len(page_items) < slots_per_page:
             page_items += [{"label": "", "image": onepixel}] * (
@@ -738,16 +936,16 @@ def create_svg_pages(
             f"\nCreating page {page_idx + 1}/{len(page_plans)} with {len(page_items)} items "
             f"from sets: {set_names}"
         )
-        for idx, item in enumerate(page_items):
-            tokenizer.modify_group_labels(idx, filter_label(item["label"]))
-            tokenizer.modify_group_images(idx, item["image"])
+        labels = [filter_label(item["label"]) for item in page_items]
+        images = [item["image"] for item in page_items]
         output_svg = os.path.join(svg_dir, f"page_{page_counter:03d}.svg")
         output_pdf = os.path.join(
             os.path.dirname(svg_dir), "pdf", f"page_{page_counter:03d}.pdf"
         )
-        tokenizer.save_svg(output_svg)
+        page_template.save_svg(output_svg, labels, images)
         print(f"Saved SVG as {os.path.basename(output_svg)}")
-        svg_pdf_pairs.append((output_svg, output_pdf))
+        page_count += 1
+        yield output_svg, output_pdf
         if pages_meta is not None:
             pages_meta.append(
                 {
@@ -762,15 +960,49 @@ def create_svg_pages(
         page_counter += 1
     if stats is not None:
         stats["pages_detail"] = pages_meta
-        stats["page_count"] = len(svg_pdf_pairs)
-    return svg_pdf_pairs
+        stats["page_count"] = page_count
+
+
+def convert_svg_to_pdf(pair):
+    """Worker entry point: render one SVG page to PDF."""
+    import cairosvg
 
+    svg_path, pdf_path = pair
+    cairosvg.svg2pdf(url=svg_path, write_to=pdf_path)
+    return svg_path
 
-def convert_svgs_to_pdfs(svg_pdf_pairs):
+
+def convert_svgs_to_pdfs(svg_pdf_pairs, page_count=None):
+    """Render ``(svg, pdf)`` pairs in worker processes and return the pairs converted.
+
+    ``svg_pdf_pairs`` may be a generator such as iter_svg_pages: each page is
+    submitted as soon as it is produced, so rendering overlaps with writing the
+    remaining SVGs. Pass ``page_count`` to size the pool in that case.
+    """
     print("\n=== Converting SVGs to PDFs in parallel ===")
-    for svg_path, pdf_path in svg_pdf_pairs:
-        print(f"Converting {os.path.basename(svg_path)} to PDF...")
-        cairosvg.svg2pdf(url=svg_path, write_to=pdf_path)
+    if page_count is None:
+        svg_pdf_pairs = list(svg_pdf_pairs)
+        page_count = len(svg_pdf_pairs)
+    converted = []
+    if not page_count:
+        # Still run a generator to the end so it can record its stats
+        for _ in svg_pdf_pairs:
+            pass
+        return converted
+
+    def submitted():
+        for pair in svg_pdf_pairs:
+            converted.append(pair)
+            yield pair
+
+    # Pages are independent, so render them in separate processes
+    workers = min(os.cpu_count() or 1, page_count)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        # map() submits while it drains the iterable, so workers start on page 1
+        # before later pages have been written
+        for svg_path in executor.map(convert_svg_to_pdf, submitted()):
+            print(f"Converted {os.path.basename(svg_path)} to PDF")
+    return converted
 
 
 def merge_pdfs(svg_pdf_pairs, output_dir):
@@ -799,12 +1031,20 @@ def process_image_set(
     copies=1,
     stats=None,
     testmode=None,
+    max_dim=MAX_IMAGE_DIM,
+    resample=DEFAULT_RESAMPLE,
+    jpeg_quality=JPEG_QUALITY,
+    jpeg_optimize=False,
 ):
     stats = stats or {}
     stats["version"] = VERSION
     stats["parity"] = parity
     stats["cell_stack_mode"] = bool(cell_stack_mode)
     stats["copies"] = copies
+    stats["max_dim"] = max_dim
+    stats["resample"] = resample
+    stats["jpeg_quality"] = jpeg_quality
+    stats["jpeg_optimize"] = bool(jpeg_optimize)
     stats["output_dir"] = os.path.abspath(output_dir)
     stats["album_root"] = os.path.abspath(root_path)
     stats["template"] = os.path.abspath(template_path)
@@ -820,6 +1060,22 @@ def process_image_set(
         stats["status"] = "error"
         stats["error"] = "Copies must be at least 1."
         return stats
+    if max_dim < 1:
+        stats["status"] = "error"
+        stats["error"] = "Max image dimension must be at least 1."
+        return stats
+    if resample not in RESAMPLE_FILTERS:
+        stats["status"] = "error"
+        stats["error"] = f"Unknown resample filter: {resample}."
+        return stats
+    if not 1 <= jpeg_quality <= 95:
+        stats["status"] = "error"
+        stats["error"] = "JPEG quality must be between 1 and 95."
+        return stats
+
+    # Parse the template before any image work, so a broken template fails fast
+    # and no parser thread is alive when the worker pools start
+    parsed_template = bird.SVGTokenizer(template_path).parse_and_tokenize()
 
     if testmode is not None:
         set_count, min_cards, max_cards = testmode
@@ -838,7 +1094,14 @@ def process_image_set(
         stats["images"] = sum(len(images) for images in processed_sets.values())
     else:
         processed_sets = discover_and_process_images(
-            root_path, cache_path, ONEPIXEL, stats=stats
+            root_path,
+            cache_path,
+            ONEPIXEL,
+            stats=stats,
+            max_dim=max_dim,
+            resample=resample,
+            jpeg_quality=jpeg_quality,
+            jpeg_optimize=jpeg_optimize,
         )
     if not processed_sets:
         return stats
@@ -857,7 +1120,9 @@ def process_image_set(
         )
     ]
     # Step 2: Load template info
-    _, _, slots_per_page, slice_size = load_template_info(template_path, stats=stats)
+    template, slots_per_page, slice_size = load_template_info(
+        template_path, stats=stats, template=parsed_template
+    )
     stats["status"] = "processing"
     # Step 3/4: Layout slices into pages
     rows_per_page = slots_per_page // slice_size if slice_size else 0
@@ -922,12 +1187,13 @@ def process_image_set(
         cell_stack_mode=cell_stack_mode,
     )
 
-    # Step 5: Create SVG pages
-    svg_pdf_pairs = create_svg_pages(
-        page_plans, template_path, slots_per_page, ONEPIXEL, svg_dir, stats=stats
+    # Step 5/6: Create SVG pages, converting each to PDF as soon as it is written
+    svg_pdf_pairs = convert_svgs_to_pdfs(
+        iter_svg_pages(
+            page_plans, template, slots_per_page, ONEPIXEL, svg_dir, stats=stats
+        ),
+        page_count=len(page_plans),
     )
-    # Step 6: Convert SVGs to PDFs
-    convert_svgs_to_pdfs(svg_pdf_pairs)
     # Step 7: Merge PDFs
     final_pdf = merge_pdfs(svg_pdf_pairs, output_dir)
     stats["final_pdf"] = final_pdf
@@ -965,6 +1231,29 @@ def main():
         default=1,
         help="Number of copies to emit for each card",
     )
+    parser.add_argument(
+        "--max-dim",
+        type=int,
+        default=MAX_IMAGE_DIM,
+        help=f"Largest pixel dimension of embedded card images (default: {MAX_IMAGE_DIM})",
+    )
+    parser.add_argument(
+        "--resample",
+        choices=sorted(RESAMPLE_FILTERS),
+        default=DEFAULT_RESAMPLE,
+        help=f"Resampling filter for downscaling card images (default: {DEFAULT_RESAMPLE})",
+    )
+    parser.add_argument(
+        "--jpeg-quality",
+        type=int,
+        default=JPEG_QUALITY,
+        help=f"JPEG quality of embedded card images, 1-95 (default: {JPEG_QUALITY})",
+    )
+    parser.add_argument(
+        "--jpeg-optimize",
+        action="store_true",
+        help="Run the extra Huffman optimization pass for smaller, slower-to-encode images",
+    )
     parser.add_argument(
         "--metadata-json",
         type=str,
@@ -1000,6 +1289,10 @@ def main():
         cell_stack_mode=args.cell_stack,
         copies=args.copies,
         testmode=testmode_spec,
+        max_dim=args.max_dim,
+        resample=args.resample,
+        jpeg_quality=args.jpeg_quality,
+        jpeg_optimize=args.jpeg_optimize,
     )
     if args.metadata_json:
         metadata_dir = os.path.dirname(os.path.abspath(args.metadata_json))
@@ -1017,6 +1310,8 @@ def main():
 
 
 if __name__ == "__main__":
+    # Required for the process pools when running as a frozen (PyInstaller) binary
+    multiprocessing.freeze_support()
     sys.exit(main())
 
 # --- Font Embedding in SVG to PDF (CairoSVG) ---
@@ -166,6 +166,8 @@ function prepareOutputDirectory(baseDir, isCustom) {
       path.join(baseDir, "svg"),
       path.join(baseDir, "pdf"),
       path.join(baseDir, ".imgcache"),
+      path.join(baseDir, ".imgcache-wal"),
+      path.join(baseDir, ".imgcache-shm"),
       path.join(baseDir, "final.pdf"),
       path.join(baseDir, "metadata.json"),
     ];
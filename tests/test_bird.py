@@ -0,0 +1,101 @@
+import importlib.util
+import sys
+
+import pytest
+
+import bird
+
+TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink"
+     width="297mm" height="420mm" viewBox="0 0 297 420">
+  <g id="layer1">
+    <rect id="frame" width="297" height="420"/>
+    <g id="card0">
+      <rect id="border0" width="45" height="45"/>
+      <image id="image0" xlink:href="data:," width="40" height="40"/>
+      <text id="label0" style="fill:#008080"><tspan id="tspan0" x="2" y="50">TXT</tspan></text>
+    </g>
+    <g id="card1">
+      <image id="image1" href="data:," width="40" height="40"/>
+      <text id="label1" x="2" y="50">txt here</text>
+    </g>
+    <g id="decoration">
+      <text id="title">Not a card</text>
+      <image id="logo" href="logo.png"/>
+    </g>
+  </g>
+</svg>
+"""
+
+
+def load_stdlib_bird(monkeypatch):
+    """Import a second copy of bird.py that falls back to xml.etree."""
+    monkeypatch.setitem(sys.modules, "lxml", None)
+    spec = importlib.util.spec_from_file_location("bird_stdlib", bird.__file__)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    assert not module._HAS_LXML
+    return module
+
+
+@pytest.fixture(params=["default", "stdlib"])
+def backend(request, monkeypatch):
+    if request.param == "default":
+        return bird
+    return load_stdlib_bird(monkeypatch)
+
+
+@pytest.fixture
+def tokenizer(tmp_path, backend):
+    template_path = tmp_path / "template.svg"
+    template_path.write_text(TEMPLATE, encoding="utf-8")
+    return backend.SVGTokenizer(template_path).parse_and_tokenize()
+
+
+def tree_edit(tokenizer, labels, hrefs):
+    page = tokenizer.clone()
+    page.apply_batch(list(zip(range(len(labels)), labels, hrefs)))
+    return page.to_bytes().decode("utf-8")
+
+
+@pytest.mark.parametrize(
+    "labels, hrefs",
+    [
+        (["First card", "Second card"], ["data:image/jpeg;base64,AAAA", "data:image/jpeg;base64,BBBB"]),
+        (
+            ['Fish & "Chips" <b>', "tab\tnewline\nreturn\r"],
+            ['a&b<c>"d"', "line\nbreak\ttab\rreturn"],
+        ),
+    ],
+    ids=["plain", "escaped"],
+)
+def test_render_matches_tree_edits(tokenizer, labels, hrefs):
+    assert tokenizer.get_total_groups() == 2
+    template = tokenizer.compile_page_template()
+
+    assert template.render(labels, hrefs) == tree_edit(tokenizer, labels, hrefs)
+
+
+def test_render_escapes_markup(tokenizer):
+    page = tokenizer.compile_page_template().render(
+        ["<b>&</b>", "plain"], ['"quoted" & <tagged>', "line\nbreak\ttab"]
+    )
+
+    assert "&lt;b&gt;&amp;&lt;/b&gt;" in page
+    assert 'xlink:href="&quot;quoted&quot; &amp; &lt;tagged&gt;"' in page
+    assert "<b>" not in page
+    # Raw newlines and tabs in an attribute would be normalized to spaces by a parser
+    assert "line\nbreak" not in page
+    assert "break\ttab" not in page
+
+
+@pytest.mark.parametrize(
+    "labels, hrefs",
+    [(["only one"], ["a", "b"]), (["a", "b"], ["only one"]), ([], [])],
+    ids=["short labels", "short hrefs", "empty"],
+)
+def test_render_rejects_lists_that_miss_groups(tokenizer, labels, hrefs):
+    template = tokenizer.compile_page_template()
+
+    with pytest.raises(ValueError):
+        template.render(labels, hrefs)
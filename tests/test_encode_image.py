@@ -0,0 +1,44 @@
+import io
+
+import pytest
+from PIL import Image
+
+import cardmaker
+
+
+def save_jpeg(path, size, mode="RGB", orientation=None):
+    image = Image.radial_gradient("L").resize(size).convert(mode)
+    exif = Image.Exif()
+    if orientation is not None:
+        exif[cardmaker.EXIF_ORIENTATION] = orientation
+    image.save(path, format="JPEG", quality=92, exif=exif)
+    return path
+
+
+def test_square_rgb_jpeg_within_bounds_passes_through(tmp_path):
+    path = save_jpeg(tmp_path / "square.jpg", (200, 200))
+
+    assert cardmaker.encode_image(str(path), max_dim=256) == path.read_bytes()
+
+
+@pytest.mark.parametrize(
+    "size, mode, orientation",
+    [
+        ((200, 200), "RGB", 6),
+        ((400, 400), "RGB", None),
+        ((200, 200), "CMYK", None),
+        ((200, 120), "RGB", None),
+    ],
+    ids=["exif rotated", "oversized", "cmyk", "not square"],
+)
+def test_other_jpegs_are_reencoded(tmp_path, size, mode, orientation):
+    path = save_jpeg(tmp_path / "card.jpg", size, mode, orientation)
+
+    encoded = cardmaker.encode_image(str(path), max_dim=256)
+
+    assert encoded != path.read_bytes()
+    with Image.open(io.BytesIO(encoded)) as result:
+        assert result.format == "JPEG"
+        assert result.mode == "RGB"
+        assert result.width == result.height <= 256
+        assert cardmaker.EXIF_ORIENTATION not in result.getexif()
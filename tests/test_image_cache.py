@@ -0,0 +1,125 @@
+import gzip
+import shutil
+import sqlite3
+
+import pytest
+from PIL import Image
+
+import cardmaker
+
+
+@pytest.fixture
+def album(tmp_path):
+    """Two sets sharing one identical file, plus one distinct image."""
+    root = tmp_path / "album"
+    (root / "set_a").mkdir(parents=True)
+    (root / "set_b").mkdir()
+    gradient = Image.radial_gradient("L").convert("RGB")
+    gradient.resize((300, 200)).save(root / "set_a" / "01_first_card.png")
+    gradient.rotate(90).resize((120, 240)).save(root / "set_a" / "02_second_card.png")
+    shutil.copyfile(root / "set_a" / "01_first_card.png", root / "set_b" / "01_copy.png")
+    return root
+
+
+def discover(root):
+    return cardmaker.discover_image_sets(str(root))
+
+
+def data_urls(processed_sets):
+    return {
+        (set_name, item["original_name"]): item["image"]
+        for set_name, items in processed_sets.items()
+        for item in items
+    }
+
+
+def count_rows(cache_path, table):
+    conn = sqlite3.connect(cache_path)
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_legacy_gzip_cache_is_discarded(tmp_path, album):
+    cache_path = str(tmp_path / ".imgcache")
+    with gzip.open(cache_path, "wt", encoding="utf-8") as f:
+        f.write("file_path,mtime,data_url\n/some/old.png,1,data:image/jpeg;base64,AAAA\n")
+
+    processed = cardmaker.process_image_sets(discover(album), cache_path=cache_path)
+
+    assert all(url.startswith("data:image/jpeg;base64,") for url in data_urls(processed).values())
+    conn = sqlite3.connect(cache_path)
+    try:
+        (version,) = conn.execute("PRAGMA user_version").fetchone()
+    finally:
+        conn.close()
+    assert version == cardmaker.IMAGE_CACHE_VERSION
+    assert count_rows(cache_path, "files") == 3
+
+
+def test_locked_cache_is_kept(tmp_path, album, monkeypatch):
+    cache_path = str(tmp_path / ".imgcache")
+    cardmaker.process_image_sets(discover(album), cache_path=cache_path)
+    monkeypatch.setattr(cardmaker, "IMAGE_CACHE_TIMEOUT", 0.1)
+
+    holder = sqlite3.connect(cache_path)
+    try:
+        holder.execute("PRAGMA locking_mode=EXCLUSIVE")
+        holder.execute("BEGIN EXCLUSIVE")
+        with pytest.raises(sqlite3.OperationalError):
+            cardmaker.open_image_cache(cache_path)
+    finally:
+        holder.close()
+
+    # A busy cache is an error to report, not a file to throw away
+    assert count_rows(cache_path, "files") == 3
+    assert count_rows(cache_path, "images") == 2
+
+
+def test_duplicate_files_are_encoded_once(tmp_path, album):
+    cache_path = str(tmp_path / ".imgcache")
+
+    processed = cardmaker.process_image_sets(discover(album), cache_path=cache_path)
+
+    urls = data_urls(processed)
+    assert urls[("set_a", "01_first_card.png")] == urls[("set_b", "01_copy.png")]
+    assert count_rows(cache_path, "files") == 3
+    assert count_rows(cache_path, "images") == 2
+
+
+def test_warm_run_reuses_cached_data_urls(tmp_path, album, monkeypatch):
+    cache_path = str(tmp_path / ".imgcache")
+    image_sets = discover(album)
+    cold = cardmaker.process_image_sets(image_sets, cache_path=cache_path)
+
+    # Every image is a cache hit, so no worker pool may be started
+    def no_pool(*args, **kwargs):
+        raise AssertionError("warm run started a worker pool")
+
+    monkeypatch.setattr(cardmaker.concurrent.futures, "ProcessPoolExecutor", no_pool)
+    warm = cardmaker.process_image_sets(image_sets, cache_path=cache_path)
+
+    assert data_urls(warm) == data_urls(cold)
+    assert count_rows(cache_path, "images") == 2
+
+
+def test_changed_settings_add_cache_variants(tmp_path, album):
+    cache_path = str(tmp_path / ".imgcache")
+    image_sets = discover(album)
+    default = data_urls(cardmaker.process_image_sets(image_sets, cache_path=cache_path))
+
+    smaller = data_urls(
+        cardmaker.process_image_sets(image_sets, cache_path=cache_path, max_dim=64)
+    )
+    assert count_rows(cache_path, "images") == 4
+    assert smaller != default
+
+    lower_quality = data_urls(
+        cardmaker.process_image_sets(image_sets, cache_path=cache_path, jpeg_quality=40)
+    )
+    assert count_rows(cache_path, "images") == 6
+    assert lower_quality != default
+
+    # The original settings still resolve to their own rows
+    assert data_urls(cardmaker.process_image_sets(image_sets, cache_path=cache_path)) == default
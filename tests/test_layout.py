@@ -0,0 +1,89 @@
+import pytest
+
+import cardmaker
+
+PLACEHOLDER = "data:placeholder"
+
+
+def make_slices(count, slice_size):
+    return [
+        {
+            "set": f"s{index}",
+            "items": [{"label": f"s{index}.{column}", "image": "data:,"} for column in range(slice_size)],
+        }
+        for index in range(count)
+    ]
+
+
+def row_layout(plan):
+    """(row set, stack, first cell) for every slice row on the page."""
+    return [
+        (entry["row_set"], entry["stack"], entry["cell"])
+        for entry in plan.space
+        if entry["position_in_slice"] == 0
+    ]
+
+
+@pytest.mark.parametrize(
+    "slots_per_page, slice_size, parity, slice_count, expected_rows, expected_cells",
+    [
+        (
+            6, 2, 1, 4,
+            [
+                [("s0", 0, 0), ("s1", 0, 2), ("s2", 0, 4)],
+                [("s3", 0, 0), (None, 0, 2), (None, 0, 4)],
+            ],
+            6,
+        ),
+        (
+            8, 2, 2, 5,
+            [
+                [("s0", 0, 0), ("s1", 0, 2), ("s4", 1, 0), (None, 1, 2)],
+                [("s2", 0, 0), ("s3", 0, 2), (None, 1, 0), (None, 1, 2)],
+            ],
+            4,
+        ),
+        (
+            8, 2, 4, 3,
+            [[("s0", 0, 0), ("s1", 1, 0), ("s2", 2, 0), (None, 3, 0)]],
+            2,
+        ),
+        (9, 3, 1, 3, [[("s0", 0, 0), ("s1", 0, 3), ("s2", 0, 6)]], 9),
+        (6, 2, 1, 0, [], 6),
+    ],
+    ids=["single stack", "two stacks", "one row per stack", "exact fit", "no slices"],
+)
+def test_group_slices_into_pages(
+    slots_per_page, slice_size, parity, slice_count, expected_rows, expected_cells
+):
+    slices = make_slices(slice_count, slice_size)
+
+    page_plans, cells_per_page = cardmaker.group_slices_into_pages(
+        slices, slots_per_page, slice_size, PLACEHOLDER, parity, {}
+    )
+
+    assert cells_per_page == expected_cells
+    assert [row_layout(plan) for plan in page_plans] == expected_rows
+    for plan in page_plans:
+        assert len(plan.items) == slots_per_page
+        assert plan.sets == [row_set for row_set, _, _ in row_layout(plan)]
+        for item, entry in zip(plan.items, plan.space):
+            assert (item["image"] == PLACEHOLDER) == entry["placeholder"]
+            if not entry["placeholder"]:
+                assert item["label"] == f"{entry['row_set']}.{entry['position_in_slice']}"
+
+
+@pytest.mark.parametrize(
+    "slots_per_page, slice_size, parity",
+    [(3, 4, 1), (6, 2, 2)],
+    ids=["slice wider than page", "rows not divisible by parity"],
+)
+def test_group_slices_into_pages_rejects_layouts(slots_per_page, slice_size, parity):
+    stats = {}
+
+    result = cardmaker.group_slices_into_pages(
+        make_slices(2, slice_size), slots_per_page, slice_size, PLACEHOLDER, parity, {}, stats
+    )
+
+    assert result == (None, None)
+    assert stats["status"] == "error"